@@ -4,7 +4,7 @@
 import logging
 import multiprocessing
 import sys
-from functools import partial
+from functools import lru_cache, partial
 from pathlib import Path
 
 import astropy.units as u
@@ -13,6 +13,8 @@ import numpy as np
 import pandas as pd
 from lmfit import Minimizer, Parameters
 
+from foam import support_functions as sf
+
 logger = logging.getLogger("logger.bop")
 
 
@@ -23,29 +25,61 @@ def generate_spacing_series(periods, errors=None):
 
     Parameters
     ----------
-    periods: list of floats
-        Periods in units of days
-     errors (optional): list of floats
+    periods: numpy array (or list) of floats
+        Periods in units of days, in either increasing or decreasing order
+    errors (optional): numpy array (or list) of floats
         Errors on periods in units of days
     Returns
     ----------
-    observed_spacings, observed_spacings_errors: tuple of lists of floats
+    observed_spacings, observed_spacings_errors: tuple of numpy arrays of floats
         period spacing series (delta P values) and its errors (if supplied) in units of seconds
     """
-    spacings = []
+    spacings = generate_spacing_series_grid(periods)
     if errors is None:
         spacings_errors = None
-        for n, period_n in enumerate(periods[:-1]):
-            spacings.append(abs(period_n - periods[n + 1]) * 86400.0)
     else:
-        spacings_errors = []
-        for n, period_n in enumerate(periods[:-1]):
-            spacings.append(abs(period_n - periods[n + 1]) * 86400.0)
-            spacings_errors.append(np.sqrt(errors[n] ** 2 + errors[n + 1] ** 2) * 86400.0)
+        errors = np.asarray(errors, dtype=np.float64)
+        # Errors of consecutive periods added in quadrature, as a single ufunc without squared temporaries
+        spacings_errors = np.hypot(errors[:-1], errors[1:])
+        spacings_errors *= 86400.0
 
     return spacings, spacings_errors
 
 
+################################################################################
+def generate_spacing_series_grid(periods, out=None, to_seconds=True):
+    """
+    Generate the period spacing series (delta P = p_(n+1) - p_n ) of all models in a grid at once
+
+    Parameters
+    ----------
+    periods: numpy array (or nested list) of floats
+        Periods in units of days along the last axis, e.g. one row per model for a 2D array.
+        Any leading axes are broadcast over, and a 1D array gives the spacing series of a single pattern.
+    out (optional): numpy array of floats
+        Array with one entry less than periods along the last axis to write the spacings in,
+        instead of allocating a new array
+    to_seconds (optional): boolean
+        Convert the spacings to units of seconds, otherwise they are kept in units of days
+    Returns
+    ----------
+    spacings: numpy array of floats
+        period spacing series (delta P values) in units of seconds (or days if to_seconds is False),
+        with the same leading axes as periods
+    """
+    # Row-major layout, so that the differences are taken along the contiguous axis
+    periods = np.ascontiguousarray(periods, dtype=np.float64)
+    # Operate in place on the freshly allocated (or given) array to avoid extra temporaries
+    spacings = np.subtract(periods[..., 1:], periods[..., :-1], out=out)
+    # The sign of the differences is not fixed: the periods can be ordered either way, and theoretical
+    # patterns can hold a value of -1 for observations without a theoretical counterpart.
+    np.abs(spacings, out=spacings)
+    if to_seconds:
+        spacings *= 86400.0
+
+    return spacings
+
+
 ################################################################################
 def construct_theoretical_puls_pattern(
     pulsation_grid_file,
@@ -103,21 +137,42 @@ def construct_theoretical_puls_pattern(
     obs_err = np.asarray(obs_dataframe[f"{which_observable}_err"])
 
     # if frequency was filled in as 0, it indicates an interruption in the pattern
-    missing_puls = np.where(obs == 0)[0]
-    # remove values indicating interruptions in the pattern
-    obs_without_missing = obs[obs != 0]
-    # remove values indicating interruptions in the pattern
-    obs_err_without_missing = obs_err[obs_err != 0]
-    # Adjust indices for removed 0-values of missing frequencies
-    missing_puls = [missing_puls[i] - i for i in range(len(missing_puls))]
+    is_missing = obs == 0
+    # remove values indicating interruptions in the pattern, from both the observations and their errors
+    obs_without_missing = obs[~is_missing]
+    obs_err_without_missing = obs_err[~is_missing]
+    # Indices of the interruptions, adjusted for the removed 0-values of missing frequencies before them
+    missing_puls = np.flatnonzero(is_missing)
+    missing_puls = missing_puls - np.arange(len(missing_puls))
 
     # split into different parts of the interrupted pattern
     obs_pattern_parts = np.split(obs_without_missing, missing_puls)
     obs_err_pattern_parts = np.split(obs_err_without_missing, missing_puls)
 
+    # Check once for all models if pattern_starting_pulsation has enough entries, to not truncate parts in the zip.
+    if len(obs_pattern_parts) != len(pattern_starting_pulsation):
+        if method_build_series == "provided-pulsation":
+            sys.exit(
+                logger.error(
+                    "Amount of pulsations specified to build patterns from is not equal to the amount of split-off parts in the pattern."
+                )
+            )
+        # Content of pattern_starting_pulsation doesn't matter if it's not used to build the pattern.
+        else:
+            # We only care about the length if the method doesn't use specified pulsations.
+            pattern_starting_pulsation = [None] * len(obs_pattern_parts)
+
+    # Split the grid once in the model parameters and an array with the frequencies of all the radial orders,
+    # to send light-weight rows to the processors instead of pickling a pandas series per model
+    freq_columns = theory_dataframe.filter(like="n_pg").columns
+    orders = np.fromiter((int(o.replace("n_pg", "")) for o in freq_columns), dtype=int, count=len(freq_columns))
+    model_parameters = theory_dataframe.drop(columns=freq_columns).to_dict(orient="records")
+    model_freqs = theory_dataframe[freq_columns].to_numpy(dtype=np.float64, copy=False)
+
     # partial function fixes all parameters of the function except for 1 that is iterated over in the multiprocessing pool.
     theory_pattern_func = partial(
         theoretical_pattern_from_dfrow,
+        orders=orders,
         obs=obs,
         obs_pattern_parts=obs_pattern_parts,
         obs_err_pattern_parts=obs_err_pattern_parts,
@@ -132,29 +187,82 @@ def construct_theoretical_puls_pattern(
 
     # Make the output file directory
     Path(Path(output_file).parent).mkdir(parents=True, exist_ok=True)
-    # Send the rows of the dataframe iteratively to a pool of processors to get the theoretical pattern for each model
-    with multiprocessing.Pool(nr_cpu) as p:
-        freqs = p.imap(theory_pattern_func, theory_dataframe.iterrows())
-        header_parameters = ["rot", "rot_err"] + grid_parameters
-
-        for i in range(1, obs_dataframe.shape[0] + 1):
-            if i - 1 in np.where(obs_dataframe.index == "f_missing")[0]:
-                f = f"{which_observable}_missing"
-            else:
-                f = f"{which_observable}{i}"
-            header_parameters.append(f.strip())
-
-        data = []
-        for line in freqs:
-            data.append(line)
+    # Header of the output file, with the positions of the interruptions in the pattern determined once
+    header_parameters = ["rot", "rot_err"] + grid_parameters
+    missing_positions = set(np.where(obs_dataframe.index == "f_missing")[0])
+    for i in range(1, obs_dataframe.shape[0] + 1):
+        if i - 1 in missing_positions:
+            f = f"{which_observable}_missing"
+        else:
+            f = f"{which_observable}{i}"
+        header_parameters.append(f.strip())
+
+    # Send the models iteratively to a pool of processors to get the theoretical pattern for each model,
+    # and collect the returned rows in the same order as the models in the grid.
+    # The partial function (holding the observations and the asymptotic object) and the grid are passed once to each
+    # processor when it starts (shared copy-on-write when processes are forked), so only the row index of each model
+    # needs to be sent to the pool.
+    with multiprocessing.Pool(
+        nr_cpu, initializer=_init_pool_worker, initargs=(theory_pattern_func, model_parameters, model_freqs)
+    ) as p:
+        chunksize = sf.pool_chunksize(len(model_freqs), nr_cpu)
+        data = list(p.imap(_call_pool_worker, range(len(model_freqs)), chunksize=chunksize))
 
     df = pd.DataFrame(data=data, columns=header_parameters)
-    df.to_hdf(path_or_buf=output_file, key="selected_puls_grid", format="table", mode="w")
+    df.to_hdf(
+        path_or_buf=output_file, key="selected_puls_grid", format="table", mode="w", complib="blosc:lz4", complevel=4
+    )
+
+
+################################################################################
+# Function applied to each model by the processors of the multiprocessing pool, and the grid of models
+_pool_worker_func = None
+_pool_model_parameters = None
+_pool_model_freqs = None
+
+
+################################################################################
+def _init_pool_worker(func, model_parameters, model_freqs):
+    """
+    Store the function to apply to each model, and the grid of models, in the processor of the multiprocessing pool.
+
+    Parameters
+    ----------
+    func: function
+        Function that will be called by '_call_pool_worker'.
+    model_parameters: list of dict
+        The model parameters of each model in the grid.
+    model_freqs: numpy array, dtype=float
+        Array with the pulsation frequencies of the grid, one row per model.
+    """
+    global _pool_worker_func, _pool_model_parameters, _pool_model_freqs
+    _pool_worker_func = func
+    _pool_model_parameters = model_parameters
+    _pool_model_freqs = model_freqs
+
+
+################################################################################
+def _call_pool_worker(model_index):
+    """
+    Apply the function stored by '_init_pool_worker' in this processor to a model of the grid.
+
+    Parameters
+    ----------
+    model_index: int
+        Row index of the model in the grid.
+
+    Returns
+    ----------
+    output:
+        The output of the stored function.
+    """
+    return _pool_worker_func((_pool_model_parameters[model_index], _pool_model_freqs[model_index]))
 
 
 # %%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%
 def theoretical_pattern_from_dfrow(
     summary_grid_row,
+    orders,
     obs,
     obs_pattern_parts,
     obs_err_pattern_parts,
@@ -171,10 +279,11 @@ def theoretical_pattern_from_dfrow(
 
     Parameters
     ----------
-    summary_grid_row: tuple, made of (int, pandas series)
-        tuple returned from pandas.iterrows(), first tuple entry is the row index of the pandas dataFrame
-        second tuple entry is a pandas series, containing a row from the pandas dataFrame.
-        (This row holds model parameters and pulsation frequencies.)
+    summary_grid_row: tuple, made of (dict, numpy array)
+        first tuple entry is a dictionary with the model parameters of a row from the pandas dataFrame,
+        second tuple entry is a numpy array with the pulsation frequencies of that row.
+    orders: numpy array, dtype=int
+        Array with the radial orders of the pulsation frequencies in summary_grid_row.
     obs: numpy array, dtype=float
         Array of observed frequencies or periods. (Ordered increasing in frequency.)
     obs_pattern_parts : list of numpy array, dtype=float
@@ -195,6 +304,7 @@ def theoretical_pattern_from_dfrow(
         Only needed if you set method_build_series=provided-pulsation
         Value of the pulsation to start building the pattern from, one for each separated part of the pattern.
         The unit of this value needs to be the same as the observable set through which_observable.
+        Needs to have one entry per part in obs_pattern_parts (checked in 'construct_theoretical_puls_pattern').
     asymptotic_object: asymptotic (see 'gmode_rotation_scaling')
         Object to calculate g-mode period spacing patterns in the asymptotic regime using the TAR.
     estimated_rotation: float
@@ -208,26 +318,11 @@ def theoretical_pattern_from_dfrow(
         The input parameters and pulsation frequencies of the theoretical pattern
         (or periods, depending on 'which_observable').
     """
-    # all keys containing n_pg (these are all the radial orders)
-    freqs = np.asarray(summary_grid_row[1].filter(like="n_pg"))
-    # array with radial orders
-    orders = np.asarray([int(o.replace("n_pg", "")) for o in summary_grid_row[1].filter(like="n_pg").index])
-    orders = orders[~np.isnan(freqs)]
+    model_parameters, freqs = summary_grid_row
     # remove all entries that are NaN in the numpy array (for when the models have a different amount of computed modes)
-    freqs = freqs[~np.isnan(freqs)]
-
-    # Check if pattern_starting_pulsation has enough entries to not truncate other parts in the zip function.
-    if len(obs_pattern_parts) != len(pattern_starting_pulsation):
-        if method_build_series == "provided-pulsation":
-            sys.exit(
-                logger.error(
-                    "Amount of pulsations specified to build patterns from is not equal to the amount of split-off parts in the pattern."
-                )
-            )
-        # Content of pattern_starting_pulsation doesn't matter if it's not used to build the pattern.
-        else:
-            # We only care about the length if the method doesn't use specified pulsations.
-            pattern_starting_pulsation = [None] * len(obs_pattern_parts)
+    computed_modes = ~np.isnan(freqs)
+    orders = orders[computed_modes]
+    freqs = freqs[computed_modes]
 
     # In this case, rescaling nor optimisation will happen
     if asymptotic_object is None:
@@ -247,7 +342,7 @@ def theoretical_pattern_from_dfrow(
 
         list_out = [estimated_rotation, 0]
         for parameter in grid_parameters:
-            list_out.append(summary_grid_row[1][parameter])
+            list_out.append(model_parameters[parameter])
 
         selected_pulsations = obs + residual
         list_out.extend(selected_pulsations)
@@ -305,69 +400,95 @@ def theoretical_pattern_from_dfrow(
         optimised_pulsations = result_minimizer.residual + obs
 
         if result_minimizer.message != "Fit succeeded.":
+            model = {k: v for k, v in model_parameters.items() if k != "rot"}
             logger.warning(
                 f"""Fitting rotation did not succeed: {result_minimizer.message}
-                            for model {summary_grid_row[1].drop(summary_grid_row[1].filter(regex='n_pg').index).drop('rot').to_dict()} using method: {method_build_series}
+                            for model {model} using method: {method_build_series}
                             rotation found: {result_minimizer.params['rotation'].value} with error: {result_minimizer.params['rotation'].stderr}"""
             )
 
         if plot_rotation_optimisation:
-            fig1, ax1 = plt.subplots()
-            if which_observable == "frequency":
-                obsperiod = 1 / obs
-                optimised_periods = 1 / optimised_pulsations
-            else:
-                obsperiod = obs
-                optimised_periods = optimised_pulsations
-
-            # Recombine observational errors in one array
-            combined_obs_err = []
-            for obs_err_part in obs_err_pattern_parts:
-                if len(combined_obs_err) > 0:
-                    combined_obs_err.extend([0])
-                combined_obs_err.extend(obs_err_part)
-            combined_obs_err = np.asarray(combined_obs_err)
-
-            spacings = generate_spacing_series(obsperiod, combined_obs_err)
-            ax1.errorbar(obsperiod[:-1], spacings[0], fmt="o", yerr=spacings[1], label="obs", color="blue", alpha=0.8)
-            ax1.plot(obsperiod[:-1], spacings[0], color="blue")
-            ax1.plot(
-                optimised_periods[:-1],
-                generate_spacing_series(optimised_periods)[0],
-                "*",
-                ls="solid",
-                color="orange",
-                label="optimised",
-            )
-            ax1.plot(
-                1 / freqs[:-1], generate_spacing_series(1 / freqs)[0], ".", ls="solid", label="initial", color="green"
-            )
-
-            fig2, ax2 = plt.subplots()
-
-            ax2.errorbar(obs, obs, fmt="o", xerr=combined_obs_err, label="obs", color="blue", alpha=0.8)
-            ax2.plot(optimised_periods, optimised_periods, "*", color="orange", label="optimised")
-            ax2.plot(1 / freqs, 1 / freqs, ".", label="initial", color="green")
-
-            ax1.legend(prop={"size": 14})
-            ax2.legend(prop={"size": 14})
-            ax1.set_title(
-                f"initial omega = {estimated_rotation}, optimised omega = {result_minimizer.params['rotation'].value}"
-            )
-            ax2.set_title(
-                f"initial omega = {estimated_rotation}, optimised omega = {result_minimizer.params['rotation'].value}"
+            plot_rotation_optimisation_result(
+                obs,
+                obs_err_pattern_parts,
+                freqs,
+                optimised_pulsations,
+                which_observable,
+                estimated_rotation,
+                result_minimizer.params["rotation"].value,
             )
-            plt.show()
 
         # Create list with rotation, its error, all the input parameters, and the optimised pulsations
         list_out = [result_minimizer.params["rotation"].value, result_minimizer.params["rotation"].stderr]
         for parameter in grid_parameters:
-            list_out.append(summary_grid_row[1][parameter])
+            list_out.append(model_parameters[parameter])
         list_out.extend(optimised_pulsations)
 
     return list_out
 
 
+################################################################################
+def plot_rotation_optimisation_result(
+    obs, obs_err_pattern_parts, freqs, optimised_pulsations, which_observable, estimated_rotation, optimised_rotation
+):
+    """
+    Plot the observed pattern together with the theoretical patterns before and after optimising the rotation rate.
+
+    Parameters
+    ----------
+    obs: numpy array, dtype=float
+        Array of observed frequencies or periods. (Ordered increasing in frequency.)
+    obs_err_pattern_parts : list of numpy array, dtype=float
+        The errors on the observed frequencies or periods, per split off part of the observed pattern.
+    freqs: numpy array, dtype=float
+        Theoretical pulsation frequencies of the model at the initial rotation rate.
+    optimised_pulsations: numpy array, dtype=float
+        Theoretical frequencies or periods of the pattern at the optimised rotation rate.
+    which_observable: string
+        Which observables are used in the pattern building, options are 'frequency' or 'period'.
+    estimated_rotation: float
+        Initial estimate of the rotation rate.
+    optimised_rotation: float
+        Rotation rate resulting from the optimisation.
+    """
+    fig1, ax1 = plt.subplots()
+    if which_observable == "frequency":
+        obsperiod = 1 / obs
+        optimised_periods = 1 / optimised_pulsations
+    else:
+        obsperiod = obs
+        optimised_periods = optimised_pulsations
+
+    # Recombine observational errors in one array, with a zero at the interruptions of the pattern
+    part_ends = np.cumsum([len(obs_err_part) for obs_err_part in obs_err_pattern_parts])[:-1]
+    combined_obs_err = np.insert(np.concatenate(obs_err_pattern_parts), part_ends, 0)
+
+    spacings = generate_spacing_series(obsperiod, combined_obs_err)
+    ax1.errorbar(obsperiod[:-1], spacings[0], fmt="o", yerr=spacings[1], label="obs", color="blue", alpha=0.8)
+    ax1.plot(obsperiod[:-1], spacings[0], color="blue")
+    ax1.plot(
+        optimised_periods[:-1],
+        generate_spacing_series(optimised_periods)[0],
+        "*",
+        ls="solid",
+        color="orange",
+        label="optimised",
+    )
+    ax1.plot(1 / freqs[:-1], generate_spacing_series(1 / freqs)[0], ".", ls="solid", label="initial", color="green")
+
+    fig2, ax2 = plt.subplots()
+
+    ax2.errorbar(obs, obs, fmt="o", xerr=combined_obs_err, label="obs", color="blue", alpha=0.8)
+    ax2.plot(optimised_periods, optimised_periods, "*", color="orange", label="optimised")
+    ax2.plot(1 / freqs, 1 / freqs, ".", label="initial", color="green")
+
+    ax1.legend(prop={"size": 14})
+    ax2.legend(prop={"size": 14})
+    ax1.set_title(f"initial omega = {estimated_rotation}, optimised omega = {optimised_rotation}")
+    ax2.set_title(f"initial omega = {estimated_rotation}, optimised omega = {optimised_rotation}")
+    plt.show()
+
+
 # %%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%
 def rescale_rotation_and_select_theoretical_pattern(
     params,
@@ -443,47 +564,54 @@ def rescale_rotation_and_select_theoretical_pattern(
 
     periods = 1 / freqs
 
-    output_pulsations = []
+    # If input is in increasing radial order (decreasing n_pg, since n_pg is negative for g-modes)
+    increasing_radial_order = len(orders) > 1 and orders[1] == orders[0] - 1
+
+    # Zeros indicate the interruptions in the pattern, the parts are filled in at their position in the observations
+    output_pulsations = np.zeros(len(obs))
+    part_start = 0
     for obs_part, obs_err_part, pattern_starting_pulsation_part in zip(
         obs_pattern_parts, obs_err_pattern_parts, pattern_starting_pulsation
     ):
-        # To indicate interruptions in the pattern
-        if len(output_pulsations) > 0:
-            output_pulsations.append(0)
+        if part_start > 0:
+            # Pulsations chosen in the previous parts, without the zeros and the -1 values for missing counterparts
+            chosen_pulsations = output_pulsations[:part_start]
+            chosen_pulsations = chosen_pulsations[chosen_pulsations > 0]
 
         if which_observable == "frequency":
             # remove frequencies that were already chosen in a different, split-off part of the pattern
-            if len(output_pulsations) > 0:
-                # If input is in increasing radial order (decreasing n_pg, since n_pg is negative for g-modes)
-                if orders[1] == orders[0] - 1:
-                    # index -2 to get lowest, non-zero freq
-                    np.delete(freqs, np.where(freqs >= output_pulsations[-2]))
+            if part_start > 0 and len(chosen_pulsations) > 0:
+                if increasing_radial_order:
+                    keep = freqs < min(chosen_pulsations)
                 # If input is in decreasing radial order
                 else:
-                    np.delete(freqs, np.where(freqs <= max(output_pulsations)))
+                    keep = freqs > max(chosen_pulsations)
+                freqs, periods, orders = freqs[keep], periods[keep], orders[keep]
             theory_value = freqs
-            obs_period = 1 / obs_part
-            obs_period_err = obs_err_part / obs_part**2
             highest_obs_freq = max(obs_part)
 
         elif which_observable == "period":
             # remove periods that were already chosen in a different, split-off part of the pattern
-            if len(output_pulsations) > 0:
-                # If input is in increasing radial order (decreasing n_pg, since n_pg is negative for g-modes)
-                if orders[1] == orders[0] - 1:
-                    np.delete(periods, np.where(periods <= max(output_pulsations)))
+            if part_start > 0 and len(chosen_pulsations) > 0:
+                if increasing_radial_order:
+                    keep = periods > max(chosen_pulsations)
                 # If input is in decreasing radial order
                 else:
-                    # index -2 to get lowest, non-zero period
-                    np.delete(periods, np.where(periods >= output_pulsations[-2]))
+                    keep = periods < min(chosen_pulsations)
+                freqs, periods, orders = freqs[keep], periods[keep], orders[keep]
             theory_value = periods
-            obs_period = obs_part
-            obs_period_err = obs_err_part
             # highest frequency is lowest period
             highest_obs_freq = min(obs_part)
         else:
             sys.exit(logger.error("Unknown observable to fit"))
 
+        # If the previous parts of the pattern used up the theoretical pulsations this part needs,
+        # indicate the missing theoretical counterparts with -1 values.
+        if part_start > 0 and len(theory_value) < len(obs_part):
+            output_pulsations[part_start : part_start + len(obs_part)] = -1
+            part_start += len(obs_part) + 1
+            continue
+
         if method_build_series == "provided-pulsation":
             selected_theoretical_pulsations = puls_series_from_given_puls(
                 theory_value, obs_part, pattern_starting_pulsation_part
@@ -491,8 +619,14 @@ def rescale_rotation_and_select_theoretical_pattern(
         elif method_build_series == "highest-frequency":
             selected_theoretical_pulsations = puls_series_from_given_puls(theory_value, obs_part, highest_obs_freq)
         elif method_build_series == "chisq-longest-sequence":
+            # The observations are the same for all models and rotation rates, so their conversion is cached
+            obs_period, obs_period_err, obs_series_err = _observed_period_pattern(
+                np.asarray(obs_part, dtype=np.float64).tobytes(),
+                np.asarray(obs_err_part, dtype=np.float64).tobytes(),
+                which_observable,
+            )
             series_chi2, final_theoretical_periods, corresponding_orders = chisq_longest_sequence(
-                periods, orders, obs_period, obs_period_err
+                periods, orders, obs_period, obs_period_err, obs_series_errors=obs_series_err
             )
             if which_observable == "frequency":
                 selected_theoretical_pulsations = 1 / np.asarray(final_theoretical_periods)
@@ -501,11 +635,50 @@ def rescale_rotation_and_select_theoretical_pattern(
         else:
             sys.exit(logger.error(f"Unrecognised method to build pulsation series: {method_build_series}"))
 
-        output_pulsations.extend(selected_theoretical_pulsations)
+        output_pulsations[part_start : part_start + len(obs_part)] = selected_theoretical_pulsations
+        # Skip the zero of the interruption after this part
+        part_start += len(obs_part) + 1
 
     return output_pulsations - obs
 
 
+################################################################################
+@lru_cache(maxsize=32)
+def _observed_period_pattern(obs_part_bytes, obs_err_part_bytes, which_observable):
+    """
+    Convert a part of the observed pattern to periods, and calculate the errors on its period spacing series.
+    Cached, since the observations are the same for all models in the grid and all rotation rates in the optimisation.
+
+    Parameters
+    ----------
+    obs_part_bytes: bytes
+        Raw float64 data of the observed frequencies or periods in the part of the pattern.
+    obs_err_part_bytes: bytes
+        Raw float64 data of the errors on the observed frequencies or periods.
+    which_observable: string
+        Which observables are used in the pattern building, options are 'frequency' or 'period'.
+
+    Returns
+    ----------
+    obs_period, obs_period_err, obs_series_err: tuple of read-only numpy arrays, dtype=float
+        The observed periods and their errors in units of days, and the errors on their period spacing series in seconds.
+    """
+    obs_part = np.frombuffer(obs_part_bytes, dtype=np.float64)
+    obs_err_part = np.frombuffer(obs_err_part_bytes, dtype=np.float64)
+    if which_observable == "frequency":
+        obs_period = 1 / obs_part
+        obs_period_err = obs_err_part / obs_part**2
+    else:
+        obs_period = obs_part
+        obs_period_err = obs_err_part
+    _, obs_series_err = generate_spacing_series(obs_period, obs_period_err)
+
+    # The same arrays are returned on every call, so make sure they are not altered by the callers
+    for array in (obs_period, obs_period_err, obs_series_err):
+        array.setflags(write=False)
+    return obs_period, obs_period_err, obs_series_err
+
+
 ################################################################################
 def puls_series_from_given_puls(theory_in, obs, obs_to_build_from, plot=False):
     """
@@ -525,29 +698,22 @@ def puls_series_from_given_puls(theory_in, obs, obs_to_build_from, plot=False):
 
     Returns
     ----------
-    theory_sequence: list of float
+    theory_sequence: numpy array, dtype=float
         The constructed theoretical frequency pattern
     """
     # get index of observation to build the series from
     nth_obs = np.where(obs == obs_to_build_from)[0][0]
     # search theoretical freq closest to the given observed one
-    diff = abs(theory_in - obs_to_build_from)
+    diff = np.abs(theory_in - obs_to_build_from)
     # get index of this theoretical frequency
-    index = np.where(diff == min(diff))[0][0]
-
-    # Insert a value of -1 if observations miss a theoretical counterpart in the beginning
-    theory_sequence = []
-    if (index - nth_obs) < 0:
-        for i in range(abs((index - nth_obs))):
-            theory_sequence.append(-1)
-        theory_sequence.extend(theory_in[0 : index + (len(obs) - nth_obs)])
-    else:
-        theory_sequence.extend(theory_in[index - nth_obs : index + (len(obs) - nth_obs)])
+    index = int(np.argmin(diff))
 
-    # Insert a value of -1 if observations miss a theoretical counterpart at the end
-    if index + (len(obs) - nth_obs) > len(theory_in):
-        for i in range((index + (len(obs) - nth_obs)) - len(theory_in)):
-            theory_sequence.append(-1)
+    # First and last (exclusive) index of the theoretical pattern
+    start = index - nth_obs
+    end = index + (len(obs) - nth_obs)
+    # A value of -1 indicates that observations miss a theoretical counterpart in the beginning or at the end
+    theory_sequence = np.full(len(obs), -1.0)
+    theory_sequence[max(0, -start) : len(obs) - max(0, end - len(theory_in))] = theory_in[max(0, start) : end]
 
     if plot is True:
         fig = plt.figure()
@@ -570,7 +736,7 @@ def puls_series_from_given_puls(theory_in, obs, obs_to_build_from, plot=False):
 
 
 ################################################################################
-def chisq_longest_sequence(theory_periods, orders, obs_periods, obs_periods_errors):
+def chisq_longest_sequence(theory_periods, orders, obs_periods, obs_periods_errors, obs_series_errors=None):
     """
     Method to extract the theoretical pattern that best matches the observed one.
     Match each observed mode period to its best matching theoretical counterpart,
@@ -588,6 +754,9 @@ def chisq_longest_sequence(theory_periods, orders, obs_periods, obs_periods_erro
         Observational periods.
     obs_periods_errors: numpy array, dtype=float
         The errors on obs_periods.
+    obs_series_errors: numpy array, dtype=float
+        The errors on the period spacing series of obs_periods in units of seconds,
+        computed from obs_periods_errors if not given.
 
     Returns
     ----------
@@ -595,100 +764,75 @@ def chisq_longest_sequence(theory_periods, orders, obs_periods, obs_periods_erro
         chi2 value of the selected theoretical frequencies.
     final_theoretical_periods: numpy array, dtype=float
         The selected theoretical periods that best match the observed pattern.
-    corresponding_orders: list of integers
+    corresponding_orders: numpy array, dtype=int
         The radial orders of the returned theoretical periods.
     """
     if len(theory_periods) < len(obs_periods):
-        return 1e16, [-1.0 for i in range(len(obs_periods))], [-1 for i in range(len(obs_periods))]
+        return 1e16, np.full(len(obs_periods), -1.0), np.full(len(obs_periods), -1, dtype=int)
     else:
         # Find the best matches per observed period
-        pairs_orders = []
-        for ii, period in enumerate(obs_periods):
-            ## Chi_squared array definition
-            chi_sqrs = np.array(
-                [((period - theory_period) / obs_periods_errors[ii]) ** 2 for theory_period in theory_periods]
-            )
-
-            ## Locate the theoretical frequency (and accompanying order) with the best chi2
-            min_ind = np.where(chi_sqrs == min(chi_sqrs))[0]
-            best_match = theory_periods[min_ind][0]
-            best_order = orders[min_ind][0]
-
-            ## Toss everything together for bookkeeping
-            pairs_orders.append([period, best_match, int(best_order), chi_sqrs[min_ind][0]])
-
-        pairs_orders = np.array(pairs_orders)
+        obs_periods = np.asarray(obs_periods)
+        obs_periods_errors = np.asarray(obs_periods_errors)
+        ## Locate the theoretical frequency (and accompanying order) with the best chi2.
+        ## The error only scales each observed period's chi2 values, so the closest match can be found
+        ## on the absolute differences, one row per observed period and one column per theoretical period.
+        min_ind = np.argmin(np.abs(obs_periods[:, np.newaxis] - theory_periods[np.newaxis, :]), axis=1)
+        best_match = theory_periods[min_ind]
+        best_order = orders[min_ind].astype(int)
+        # Only divide by the errors for the selected pairs
+        chi_sqrs = ((obs_periods - best_match) / obs_periods_errors) ** 2
+
+        ## Toss everything together for bookkeeping
+        pairs_orders = np.column_stack((obs_periods, best_match, best_order, chi_sqrs))
 
         # If input is in increasing radial order (decreasing n_pg, since n_pg is negative for g-modes)
-        if orders[1] == orders[0] - 1:
+        if len(orders) > 1 and orders[1] == orders[0] - 1:
             increase_or_decrease = -1
         # If input is in decreasing radial order
         else:
             increase_or_decrease = 1
 
-        sequences = []
         ## Go through all pairs of obs and theoretical frequencies and
         ## check if the next observed frequency has a corresponding theoretical frequency
         ## with the consecutive radial order.
-        current = []
-        lp = len(pairs_orders[:-1])
-        for ii, sett in enumerate(pairs_orders[:-1]):
-            if abs(sett[2]) == abs(pairs_orders[ii + 1][2]) + increase_or_decrease:
-                current.append(sett)
-            # If not consecutive radial order, save the current sequence and start a new one.
-            else:
-                current.append(sett)
-                sequences.append(np.array(current).reshape(len(current), 4))
-                current = []
-            if ii == lp - 1:
-                current.append(sett)
-                sequences.append(np.array(current).reshape(len(current), 4))
-                current = []
-        len_list = np.array([len(x) for x in sequences])
-        longest = np.where(len_list == max(len_list))[0]
-
-        ## Test if there really is one longest sequence
-        if len(longest) == 1:
-            lseq = sequences[longest[0]]
-
-        ## if not, pick, of all the sequences with the same length, the best based on chi2
-        else:
-            scores = [np.sum(sequences[ii][:, -1]) / len(sequences[ii]) for ii in longest]
-            min_score = np.where(scores == min(scores))[0][0]
-            lseq = sequences[longest[min_score]]
+        consecutive = np.abs(pairs_orders[:-1, 2]) == np.abs(pairs_orders[1:, 2]) + increase_or_decrease
+        # If not consecutive radial order, the current sequence ends and a new one starts.
+        sequence_starts = np.concatenate(([0], np.flatnonzero(~consecutive) + 1))
+        len_list = np.diff(np.append(sequence_starts, len(pairs_orders)))
+        # The last pair is bookkept with the values of the pair before it
+        if len(pairs_orders) > 1:
+            pairs_orders[-1] = pairs_orders[-2]
+        longest = np.flatnonzero(len_list == len_list.max())
+
+        ## Pick, of all the sequences with the same length, the best based on chi2
+        scores = np.add.reduceat(pairs_orders[:, -1], sequence_starts) / len_list
+        best_sequence = longest[np.argmin(scores[longest])]
+        lseq_start = sequence_starts[best_sequence]
+        lseq = pairs_orders[lseq_start : lseq_start + len_list[best_sequence]]
 
         obs_ordering_ind = np.where(obs_periods == lseq[:, 0][0])[0][0]
         thr_ordering_ind = np.where(theory_periods == lseq[:, 1][0])[0][0]
 
-        ordered_theoretical_periods = []
-        corresponding_orders = []
-
-        thr_ind_start = thr_ordering_ind - obs_ordering_ind
-        thr_ind_current = thr_ind_start
-
-        for i, oper in enumerate(obs_periods):
-            thr_ind_current = thr_ind_start + i
-            if thr_ind_current < 0:
-                tper = -1
-                ordr = -1
-            elif thr_ind_current >= len(theory_periods):
-                tper = -1
-                ordr = -1
-            else:
-                tper = theory_periods[thr_ind_current]
-                ordr = orders[thr_ind_current]
-            ordered_theoretical_periods.append(tper)
-            corresponding_orders.append(ordr)
-
-        final_theoretical_periods = np.array(ordered_theoretical_periods)
-
-        obs_series, obs_series_errors = generate_spacing_series(obs_periods, obs_periods_errors)
-        thr_series, _ = generate_spacing_series(final_theoretical_periods)
-
-        obs_series = np.array(obs_series)
-        obs_series_errors = np.array(obs_series_errors)
-        thr_series = np.array(thr_series)
-
-        series_chi2 = np.sum(((obs_series - thr_series) / obs_series_errors) ** 2) / len(obs_series)
+        # Theoretical counterparts of all observed periods, -1 where they fall outside of the theoretical pattern
+        thr_indices = thr_ordering_ind - obs_ordering_ind + np.arange(len(obs_periods))
+        in_theory = (thr_indices >= 0) & (thr_indices < len(theory_periods))
+        final_theoretical_periods = np.full(len(obs_periods), -1.0)
+        final_theoretical_periods[in_theory] = theory_periods[thr_indices[in_theory]]
+        corresponding_orders = np.full(len(obs_periods), -1, dtype=int)
+        corresponding_orders[in_theory] = orders[thr_indices[in_theory]]
+
+        # Spacing series of the observed and theoretical periods in one call, and the errors of the observed series
+        obs_series, thr_series = generate_spacing_series_grid((obs_periods, final_theoretical_periods))
+        if obs_series_errors is None:
+            obs_series_errors = np.hypot(obs_periods_errors[:-1], obs_periods_errors[1:])
+            obs_series_errors *= 86400.0
+
+        # Sum of the squared residuals as a single reduction, without an array of squares in between
+        residuals = (obs_series - thr_series) / obs_series_errors
+        if len(obs_series) > 0:
+            series_chi2 = np.einsum("i,i->", residuals, residuals) / len(obs_series)
+        else:
+            # A single observed period has no period spacings to compare
+            series_chi2 = np.nan
 
         return series_chi2, final_theoretical_periods, corresponding_orders
@@ -6,6 +6,7 @@ import multiprocessing
 from functools import partial
 from pathlib import Path
 
+import numpy as np
 import pandas as pd
 
 from foam import support_functions as sf
@@ -33,33 +34,49 @@ def extract_frequency_grid(
         Number of worker processes to use in multiprocessing.
         The default 'None' will use the number returned by os.cpu_count().
     """
-    # make empty MultiProcessing listProxy
-    mp_list = multiprocessing.Manager().list()
-
     # Glob all the files, then iteratively send them to a pool of processors
-    summary_files = glob.iglob(gyre_files)
+    summary_files = glob.glob(gyre_files)
     with multiprocessing.Pool(nr_cpu) as p:
         extract_func = partial(all_freqs_from_summary, parameters=parameters)
-        dictionaries = p.imap(extract_func, summary_files)
-        for new_row in dictionaries:
-            # Fill the listProxy with dictionaries for each read file
-            mp_list.append(new_row)
-
-        df = pd.DataFrame(data=list(mp_list))
+        # Collect the arrays for each read file directly in this process, in chunks to limit the pickling overhead
+        rows = list(p.imap(extract_func, summary_files, chunksize=sf.pool_chunksize(len(summary_files), nr_cpu)))
+
+    # All radial orders present in the grid, and one row per model with NaN for the modes that were not computed
+    if len(rows) > 0:
+        all_n_pg = np.unique(np.concatenate([n_pg for _, n_pg, _ in rows]))
+    else:
+        all_n_pg = np.empty(0, dtype=int)
+    freq_grid = np.full((len(rows), len(all_n_pg)), np.nan)
+    for i, (_, n_pg, freqs) in enumerate(rows):
+        # Filled in reversed order, so that the first listed mode is kept in case of duplicate radial orders
+        freq_grid[i, np.searchsorted(all_n_pg, n_pg[::-1])] = freqs[::-1]
+
+    # Radial orders with a sign and zero padded to 3 digits, e.g. n_pg-005
+    abs_n_pg = np.abs(all_n_pg).astype(str)
+    orders = np.where(
+        np.abs(all_n_pg) < 100, np.char.add(sf.sign_array(all_n_pg), np.char.zfill(abs_n_pg, 3)), all_n_pg.astype(str)
+    )
+    freq_columns = np.char.add("n_pg", orders)
     # Sort the columns with frequencies by their radial order
-    column_list = list(df.columns[: len(parameters)])
-    column_list.extend(sorted(df.columns[len(parameters) :]))
-    df = df.reindex(column_list, axis=1)
+    column_order = np.argsort(freq_columns, kind="stable")
+
+    df = pd.concat(
+        [
+            pd.DataFrame([param_values for param_values, _, _ in rows], columns=parameters, dtype=np.float64),
+            pd.DataFrame(freq_grid[:, column_order], columns=freq_columns[column_order].tolist()),
+        ],
+        axis=1,
+    )
 
     # Generate the directory for the output file and write the file afterwards
     Path(Path(output_file).parent).mkdir(parents=True, exist_ok=True)
-    df.to_hdf(path_or_buf=output_file, key="pulsation_grid", format="table", mode="w")
+    df.to_hdf(path_or_buf=output_file, key="pulsation_grid", format="table", mode="w", complib="blosc:lz4", complevel=4)
 
 
 ################################################################################
 def all_freqs_from_summary(gyre_summary_file, parameters):
     """
-    Extract model parameters and pulsation frequencies from a GYRE summary file
+    Extract model parameters, radial orders and pulsation frequencies from a GYRE summary file
 
     Parameters
     ----------
@@ -71,20 +88,18 @@ def all_freqs_from_summary(gyre_summary_file, parameters):
 
     Returns
     ----------
-    param_dict: dict
-        Dictionary containing all the model parameters and pulsation frequencies of the GYRE summary file.
+    param_values: list of float
+        The model parameters, in the order of 'parameters' (NaN if the parameter is not in the filename).
+    n_pg: numpy array, dtype=int
+        The radial orders of the modes in the GYRE summary file.
+    freqs: numpy array, dtype=float
+        The pulsation frequencies of these modes.
     """
 
-    _, data = sf.read_hdf5(gyre_summary_file)
+    # Only read the datasets that are needed from the file
+    _, data = sf.read_hdf5(gyre_summary_file, datasets=["freq", "n_pg"])
     param_dict = sf.get_param_from_filename(gyre_summary_file, parameters, values_as_float=True)
+    param_values = [param_dict.get(parameter, np.nan) for parameter in parameters]
 
-    # Arrange increasing in radial order
-    for j in range(len(data["freq"]) - 1, -1, -1):
-        n_pg = data["n_pg"][j]
-        if abs(n_pg) < 10:
-            n_pg = f"{sf.sign(n_pg)}00{abs(n_pg)}"
-        elif abs(n_pg) < 100:
-            n_pg = f"{sf.sign(n_pg)}0{abs(n_pg)}"
-        param_dict.update({f"n_pg{n_pg}": data["freq"][j][0]})
-
-    return param_dict
+    # Real part of the frequencies, GYRE stores the complex values as a compound of 're' and 'im'
+    return param_values, data["n_pg"], data["freq"]["re"]
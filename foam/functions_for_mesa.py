@@ -2,7 +2,8 @@
 
 import glob
 import multiprocessing
-from functools import partial
+import os
+from functools import lru_cache, partial
 from pathlib import Path
 
 import h5py
@@ -57,6 +58,51 @@ def read_mesa_file(file_path, index_col=None):
         return header, data
 
 
+################################################################################
+def read_mesa_history(hist_file):
+    """
+    Read in a MESA history file, and keep it in memory so that reading the same (unchanged) file again does not parse it again.
+    The returned dictionaries are shared between calls, and should therefore not be modified.
+
+    Parameters
+    ----------
+    hist_file: String
+        The path to the MESA history file to read in.
+
+    Returns
+    ----------
+    header: dict
+        A dictionary holding the header info of the MESA file.
+    data: dict
+        A dictionary holding the data columns of the MESA file as numpy arrays.
+    """
+    # The modification time is part of the cache key, so that a file that was updated is read in again
+    return _read_mesa_file_cached(str(hist_file), os.stat(hist_file).st_mtime_ns)
+
+
+################################################################################
+@lru_cache(maxsize=16)
+def _read_mesa_file_cached(file_path, modification_time):
+    """
+    Cached version of 'read_mesa_file', see 'read_mesa_history'.
+
+    Parameters
+    ----------
+    file_path: String
+        The path to the MESA file to read in.
+    modification_time: int
+        Modification time of the file in nanoseconds.
+
+    Returns
+    ----------
+    header: dict
+        A dictionary holding the header info of the MESA file.
+    data: dict
+        A dictionary holding the data columns of the MESA file as numpy arrays.
+    """
+    return read_mesa_file(file_path)
+
+
 ################################################################################
 def calculate_number_densities(hist_file):
     """
@@ -74,7 +120,7 @@ def calculate_number_densities(hist_file):
     number_densities: dict
         Column keys specify the element (surf_X_per_N_tot), values are number densities of that element.
     """
-    _, data = read_mesa_file(hist_file)
+    _, data = read_mesa_history(hist_file)
     element_list = {}
     number_densities = {}
     inverse_average_atomic_mass = np.zeros(len(data[list(data.keys())[0]]))
@@ -122,9 +168,9 @@ def extract_surface_grid(
 
     extract_func = partial(info_from_profiles, parameters=parameters, extra_header_items=extras_to_be_extracted)
     # Glob all the files, then iteratively send them to a pool of processors
-    profiles = glob.iglob(mesa_profiles)
+    profiles = glob.glob(mesa_profiles)
     with multiprocessing.Pool(nr_cpu) as p:
-        surface = p.imap(extract_func, profiles)
+        surface = p.imap(extract_func, profiles, chunksize=sf.pool_chunksize(len(profiles), nr_cpu))
 
         # Generate the directory for the output file and write the file afterwards
         Path(Path(output_file).parent).mkdir(parents=True, exist_ok=True)
@@ -6,6 +6,11 @@ import sys
 import astropy.units as u
 import numpy as np
 
+# Loaded lambda(nu) functions per GYRE TAR fit file, and their sampled grids per sampling of the spin parameter.
+# These are shared between all asymptotic objects, so that files are only read and sampled once per process.
+_LAM_FUNS = {}
+_LAPLACE_GRIDS = {}
+
 
 ################################################################################
 class Asymptotic(object):
@@ -67,15 +72,17 @@ class Asymptotic(object):
             mstr = f"{self.mval}"
 
         infile = f"{gyre_dir}/data/tar/tar_fit.m{mstr}.k{kstr}.h5"
+        self.tar_fit_file = infile
 
-        sys.path.append(gyre_dir + "/src/tar/")
-        import gyre_cheb_fit
-        import gyre_tar_fit
+        if infile not in _LAM_FUNS:
+            sys.path.append(gyre_dir + "/src/tar/")
+            import gyre_cheb_fit
+            import gyre_tar_fit
 
-        tf = gyre_tar_fit.TarFit.load(infile)
-        lam_fun = np.vectorize(tf.lam)
+            tf = gyre_tar_fit.TarFit.load(infile)
+            _LAM_FUNS[infile] = np.vectorize(tf.lam)
 
-        return lam_fun
+        return _LAM_FUNS[infile]
 
     ################################################################################
     def _sample_laplacegrid(self, spinmax=1000.0, spindensity=1.0):
@@ -102,6 +109,10 @@ class Asymptotic(object):
         spinsqlam: numpy array, dtype=float
             = spin * sqrt(lam)
         """
+        # Sampling was already done for this TAR fit file
+        grid_key = (self.tar_fit_file, spinmax, spindensity)
+        if grid_key in _LAPLACE_GRIDS:
+            return _LAPLACE_GRIDS[grid_key]
 
         if (self.kval >= 0) & (self.mval != 0):
             spinmin = -0.1
@@ -241,13 +252,10 @@ class Asymptotic(object):
         spin = spin[lam_exists]
         lam = lam[lam_exists]
 
-        # Calculating the derivatives
-        dlamdnu = np.gradient(lam) / np.gradient(spin)
-        d2lamdnu2 = np.gradient(dlamdnu) / np.gradient(spin)
-
         # A required array to determine the near-core rotation rate
         spinsqlam = spin * np.sqrt(lam)
 
+        _LAPLACE_GRIDS[grid_key] = (spin, lam, spinsqlam)
         return spin, lam, spinsqlam
 
     ################################################################################
@@ -80,22 +80,16 @@ def calculate_likelihood(
     # Remove columns of missing frequencies
     theory_dataframe = theory_dataframe.drop(columns=theory_dataframe.columns[missing_absolute])
     # Adjust indices for removed lines of missing frequencies
-    missing_indices = [missing_relative[i] - i for i in range(len(missing_relative))]
+    missing_indices = missing_relative - np.arange(len(missing_relative))
 
     thetas = np.asarray(theory_dataframe.filter(["rot"] + ["rot_err"] + grid_parameters))
     theory_puls = np.asarray(theory_dataframe.filter(like=f"{observed_quantity}"))
 
-    # Make new list of theoretical models without entries with value -1
-    new_theory = []
-    new_thetas = []
-    for i in range(len(theory_puls)):
-        # ignore models where one of the freqs is -1
-        if (theory_puls[i][0] != -1) and (theory_puls[i][-1] != -1):
-            # make an array of the theoretical observables for each model
-            theory_observables = create_theory_observables_array(theory_dataframe, i, observables, missing_indices)
-
-            new_theory.append(theory_observables)
-            new_thetas.append(thetas[i])
+    # Only keep the theoretical models without entries with value -1, ignore models where any of the freqs is -1
+    valid_models = (theory_puls != -1).all(axis=1)
+    # make an array of the theoretical observables for all these models at once
+    new_theory = create_theory_observables_grid(theory_dataframe.loc[valid_models], observables, missing_indices)
+    new_thetas = thetas[valid_models]
     neg_value = np.unique(np.where(theory_puls == -1)[0])
     logger.debug(f"File: {theory_file}")
     logger.debug(f"observables      : {observables}")
@@ -107,9 +101,6 @@ def calculate_likelihood(
             f"""{len(neg_value)} models were discarded due to mismatches during the selection of theoretical frequencies.
                         This is likely due to the frequency range used for the theoretical calculations being too narrow."""
         )
-    new_theory = np.asarray(new_theory)
-    new_thetas = np.asarray(new_thetas)
-
     # Dictionary containing different merit functions
     switcher = {"CS": merit_chi2, "MD": merit_mahalanobis}
 
@@ -159,34 +150,69 @@ def create_theory_observables_array(theory_dataframe, index, observables_in, mis
     observables_out: numpy array, dtype=float
         The values of the specified observables for the model.
     """
+    return create_theory_observables_grid(theory_dataframe.loc[[index]], observables_in, missing_indices)[0]
+
+
+# %%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%
+def create_theory_observables_grid(theory_dataframe, observables_in, missing_indices):
+    """
+    Create a 2D array of theoretical observables, with one row for each model in the dataFrame.
+
+    Parameters
+    ----------
+    theory_dataframe: pandas dataFrame
+        DataFrame containing the theoretical periods or frequencies (as the last columns), along with any additional
+        columns containing extra observables.
+    observables_in: list of strings
+        Which observables are included in the returned array.
+        Must contain either 'f' (frequency), 'P' (period), or 'dP' (period-spacing) which will be computed for the period pattern.
+        Can contain any additional observables that are added as columns in both the file with observations and the file with theoretical models.
+    missing_indices: list of int
+        Contains the indices of the missing pulsations so that the period spacing pattern can be split around them.
+
+    Returns
+    ----------
+    observables_out: numpy array, dtype=float
+        The values of the specified observables, with one row per model.
+    """
     # Make a copy to leave the array handed to this function unaltered.
     observables = list(observables_in)
     if "P" in observables:
-        # Cast to list before using asarray to prevent memory leak
-        # add the periods to the output list
-        observables_out = np.asarray(list(theory_dataframe.filter(like="period").loc[index]))
+        # add the periods to the output array
+        observables_out = theory_dataframe.filter(like="period").to_numpy(dtype=np.float64)
         observables.remove("P")
 
     elif "f" in observables:
-        # Cast to list before using asarray to prevent memory leak
-        # add the frequencies to the output list
-        observables_out = np.asarray(list(theory_dataframe.filter(like="frequency").loc[index]))
+        # add the frequencies to the output array
+        observables_out = theory_dataframe.filter(like="frequency").to_numpy(dtype=np.float64)
         observables.remove("f")
 
     elif "dP" in observables:
-        periods = np.asarray(theory_dataframe.filter(like="period").loc[index])
-        observables_out = []
-        for periods_part in np.split(periods, missing_indices):
-            spacing, _ = bop.generate_spacing_series(periods_part)
-            # switch back from seconds to days (so both P and dP are in days)
-            observables_out = np.append(observables_out, np.asarray(spacing) / 86400)
+        periods = theory_dataframe.filter(like="period").to_numpy(dtype=np.float64)
+        periods_parts = np.split(periods, missing_indices, axis=1)
+        # Spacings of all models at once, for each part of the pattern in between the missing pulsations,
+        # written directly in the columns of the output array for that part.
+        # Kept in units of days (so both P and dP are in days), rather than converting to seconds and back.
+        # Parts with less than 2 periods (e.g. consecutive interruptions) have no spacings
+        nr_spacings = [max(periods_part.shape[1] - 1, 0) for periods_part in periods_parts]
+        observables_out = np.empty((len(periods), sum(nr_spacings)))
+        first_column = 0
+        for periods_part, nr_part_spacings in zip(periods_parts, nr_spacings):
+            if nr_part_spacings == 0:
+                continue
+            last_column = first_column + nr_part_spacings
+            bop.generate_spacing_series_grid(
+                periods_part, out=observables_out[:, first_column:last_column], to_seconds=False
+            )
+            first_column = last_column
         observables.remove("dP")
 
     # Add all other observables in the list from the dataFrame
-    for observable in observables:
-        observables_out = np.append(observables_out, np.asarray(theory_dataframe.loc[index, observable]))
+    if len(observables) > 0:
+        observables_out = np.column_stack((observables_out, theory_dataframe[observables].to_numpy(dtype=np.float64)))
 
-    return observables_out
+    # Row-major, so that the observables of each model are contiguous in memory
+    return np.ascontiguousarray(observables_out)
 
 
 # %%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%
@@ -216,7 +242,7 @@ def create_obs_observables_array(obs_dataframe, observables):
     # get the interruptions in the pattern
     missing_indices = np.where(obs_dataframe.index.isin(["f_missing"]))[0]
     # Adjust indices for removed lines of missing frequencies
-    missing_indices = [missing_indices[i] - i for i in range(len(missing_indices))]
+    missing_indices = missing_indices - np.arange(len(missing_indices))
     # remove lines indicating missing frequencies (if they are present)
     if len(missing_indices) != 0:
         obs_dataframe = obs_dataframe.drop(index="f_missing")
@@ -243,11 +269,13 @@ def create_obs_observables_array(obs_dataframe, observables):
         period_err = np.asarray(obs_dataframe["period_err"])
         periods_parts = np.split(period, missing_indices)
         periods_err_parts = np.split(period_err, missing_indices)
+        # Spacings and their errors in units of days (so both P and dP are in days)
         for periods, periods_err in zip(periods_parts, periods_err_parts):
-            spacing, spacing_errs = bop.generate_spacing_series(periods, periods_err)
-            # switch back from seconds to days (so both P and dP are in days)
-            observables_out = np.append(observables_out, np.asarray(spacing) / 86400)
-            observables_err_out = np.append(observables_err_out, np.asarray(spacing_errs) / 86400)
+            observables_out.append(np.abs(np.diff(periods)))
+            observables_err_out.append(np.hypot(periods_err[:-1], periods_err[1:]))
+        # Join the parts in one go
+        observables_out = np.concatenate(observables_out)
+        observables_err_out = np.concatenate(observables_err_out)
 
         filename_suffix = "dP"
         observables.remove("dP")
@@ -306,7 +334,9 @@ def merit_chi2(Yobs, obs_err, YTheo, fig_title=None, star_name=None):
     chi2: numpy array, dtype=float
         chi squared values for the given theoretical values
     """
-    chi2 = np.array([np.sum(((one_YTheo - Yobs) / obs_err) ** 2) for one_YTheo in YTheo])
+    # Residuals of all models at once, and the sum of their squares per model as a single reduction
+    residuals = (np.asarray(YTheo) - Yobs) / obs_err
+    chi2 = np.einsum("ij,ij->i", residuals, residuals)
     return chi2
 
 
@@ -419,3 +449,138 @@ def check_matrix(v_matrix, generate_output=True, fig_title="Vmatrix", star_name=
         plt.savefig(f"{os.getcwd()}/V_matrix/{fig_title}.png")
         plt.clf()
         plt.close("all")
+
+
+################################################################################
+def likelihood_coefficients(merit_function, nr_observables, k, ln_det_v=None):
+    """
+    Coefficients a and b of the likelihood function of a merit function,
+    which can be written as likelihood = exp(a * merit_value + b).
+
+    Parameters
+    ----------
+    merit_function: string
+        The type of merit function, "CS" or "MD" ("chi-squared" and "mahalanobis distance").
+    nr_observables: int
+        Number of observables used in the merit function.
+    k: int
+        Number of free parameters in the grid.
+    ln_det_v: float
+        Natural logarithm of the determinant of the variance-covariance matrix, only needed if merit_function="MD".
+
+    Returns
+    ----------
+    a, b: float
+        Scale factor and constant term of the exponent of the likelihood function.
+    """
+    if merit_function == "CS":
+        # Likelihood function of reduced chi-squared
+        return -0.5 / (nr_observables - k), 0.0
+    elif merit_function == "MD":
+        # Likelihood function of the mahalanobis distance
+        return -0.5, -0.5 * (k * np.log(2 * np.pi) + ln_det_v)
+    else:
+        sys.exit(logger.error(f"invalid type of maximum likelihood estimator:{merit_function}"))
+
+
+################################################################################
+def models_in_error_ellipse(
+    merit_values_file,
+    output_file,
+    merit_function,
+    nr_observables,
+    ln_det_v=None,
+    free_parameters=None,
+    percentile=0.95,
+    likelihood_cutoff=1e-8,
+):
+    """
+    Select the models within the error ellipse of the maximum likelihood solution using Bayes' theorem,
+    and write them to a separate file. The probability of each model is its likelihood multiplied by the
+    marginal probabilities of its parameter values in the grid, and models are added in order of increasing
+    merit value until the requested percentile of the total probability is enclosed.
+    The models are written in that same order, so the best model is the first row of the output file.
+
+    Parameters
+    ----------
+    merit_values_file: string
+        Path to the hdf5 file with the merit function values and parameters of the models in the grid.
+    output_file: string
+        Path to the hdf5 file to write the models within the error ellipse to.
+    merit_function: string
+        The type of merit function used in merit_values_file, "CS" or "MD" ("chi-squared" and "mahalanobis distance").
+    nr_observables: int
+        Number of observables used in the merit function.
+    ln_det_v: float
+        Natural logarithm of the determinant of the variance-covariance matrix, only needed if merit_function="MD".
+    free_parameters: list of string
+        List of the parameters in the theoretical grid that are free parameters in the modelling.
+    percentile: float
+        Fraction of the total probability that needs to be enclosed by the error ellipse.
+    likelihood_cutoff: float
+        Models with a likelihood below this fraction of the likelihood of the best model are left out of the calculation,
+        unless an upper limit on their combined probability exceeds 1e-6 of the probability of the kept models,
+        in which case all models are included. The selected models are hence the same as without the cutoff,
+        up to this relative tolerance of 1e-6 on the total probability.
+    """
+    k = len(free_parameters)
+    # Only read the columns needed to calculate the probabilities
+    df = pd.read_hdf(merit_values_file, columns=["meritValue"] + free_parameters)
+    # row numbers of the models in the file, ordered by increasing merit value
+    order = np.argsort(df["meritValue"].to_numpy(), kind="stable")
+
+    merit_values = df["meritValue"].to_numpy()[order]
+    a, b = likelihood_coefficients(merit_function, nr_observables, k, ln_det_v)
+
+    # The likelihood decreases with merit value, so only keep the models before the likelihood drops below the cutoff
+    n_models = len(merit_values)
+    n_kept = n_models
+    if a < 0:
+        max_merit_value = merit_values[0] + np.log(likelihood_cutoff) / a
+        n_kept = int(np.searchsorted(merit_values, max_merit_value, side="right"))
+
+    log_marginals = []
+    max_log_marginal = 0
+    for column_name in free_parameters:
+        # integer code of the parameter value of each model, indexing the unique values of the parameter
+        codes, _ = pd.factorize(df[column_name].to_numpy())
+        # fraction of models in the grid having each of the values of the parameter
+        log_probabilities = np.log(np.bincount(codes) / codes.size)
+        log_marginals.append((log_probabilities, codes[order]))
+        max_log_marginal += log_probabilities.max()
+
+    while True:
+        # log-likelihood of each kept model, relative to the best model (offset folded into the constant term)
+        log_prob = a * merit_values[:n_kept] + (b - a * merit_values[0])
+        # add (in place) the log of the marginal probabilities of the parameter values of the models
+        for log_probabilities, sorted_codes in log_marginals:
+            log_prob += log_probabilities[sorted_codes[:n_kept]]
+
+        # Only exponentiate relative to the most probable model, so the probabilities can't all underflow to zero
+        log_prob_max = log_prob.max()
+        prob = np.exp(log_prob - log_prob_max)
+
+        # Upper limit on the combined probability of the left out models, on the same scale as prob
+        left_out = (n_models - n_kept) * np.exp(np.log(likelihood_cutoff) + b + max_log_marginal - log_prob_max)
+        if n_kept == n_models or left_out < 1e-6 * prob.sum():
+            break
+        # The left out models might matter, include all models
+        n_kept = n_models
+
+    cumulative_probability = np.cumsum(prob)
+    total_probability = cumulative_probability[-1]
+    # first model for which the cumulative probability reaches the percentile
+    i = int(np.searchsorted(cumulative_probability, percentile * total_probability, side="left"))
+    p = cumulative_probability[i] / total_probability
+    # Read all columns of the models enclosed within the error ellipse, and write them to a separate file
+    df_error_ellipse = pd.read_hdf(merit_values_file, where=order[: i + 1])
+    # Written once and always read in full, so no need for the slower 'table' format
+    df_error_ellipse.to_hdf(
+        path_or_buf=output_file,
+        key="models_in_2sigma_error_ellipse",
+        format="fixed",
+        mode="w",
+        complib="blosc:lz4",
+        complevel=4,
+    )
+    logger.debug(f"---------- {Path(merit_values_file).stem} ---------- {i+1} --- {p}")
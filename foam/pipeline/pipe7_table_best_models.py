@@ -35,7 +35,8 @@ for merit in config.merit_functions:
                 obs += extra_obs
                 MLE_values_file = f"{directory_prefix}meritvalues/{config.star}_{grid}_{pattern}_{merit}_{obs}_2sigma-error-ellipse.hdf"
                 df = pd.read_hdf(MLE_values_file)
-                best_model = df.loc[df["meritValue"].idxmin()]
+                # Models in the error ellipse are stored in order of increasing merit value
+                best_model = df.iloc[0]
 
                 best_model_dict.update({f"{grid} {merit} {obs} {pattern}": best_model})
 
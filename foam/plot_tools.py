@@ -622,7 +622,7 @@ def plot_hrd(
         fig = plt.figure()
         ax = fig.add_subplot(111)
 
-    header, data = ffm.read_mesa_file(hist_file)
+    header, data = ffm.read_mesa_history(hist_file)
 
     # From "data", extract the required columns as numpy arrays
     log_L = np.asarray(data["log_L"])
@@ -698,7 +698,7 @@ def plot_khd(hist_file, ax=None, number_mix_zones=8, xaxis="model_number"):
         fig = plt.figure(figsize=(10, 4))
         ax = fig.add_subplot(111)
 
-    _, data = ffm.read_mesa_file(hist_file)
+    _, data = ffm.read_mesa_history(hist_file)
 
     x_values = data[xaxis]
     m_star = data["star_mass"]
@@ -1,14 +1,19 @@
 """Helpful functions in general. Reading HDF5, processing strings, manipulating dataFrames..."""
 
 import logging
+import os
 import re
 from pathlib import Path
 
 import h5py
+import numpy as np
 import pandas as pd
 
 logger = logging.getLogger("logger.sf")
 
+# Parameter name followed by its value, in the underscore separated parts of a filename (e.g. 'Z0.008_M3.00_Xc0.10')
+_PARAM_RE = re.compile(r"(?:^|_)([^\W\d_][^\W_]*?)(-?\d[^_]*)(?=_|$)")
+
 
 ################################################################################
 def split_line(line, sep):
@@ -79,23 +84,28 @@ def get_param_from_filename(file_path, parameters, values_as_float=False):
         Keys are strings describing the parameter, values are strings giving corresponding parameter values
     """
 
+    # All parameter names and values in the filename, parsed in one sweep
+    filename_params = {}
+    for name, value in _PARAM_RE.findall(Path(file_path).stem):
+        filename_params.setdefault(name, value)
+
     param_dict = {}
     for parameter in parameters:
-        try:
-            p = substring(Path(file_path).stem, parameter, "_")
-            if values_as_float:
-                p = float(p)
-            param_dict[parameter] = p
-        except:
+        if parameter not in filename_params:
             logger.warning(
                 f"In get_param_from_filename: parameter \"{parameter}\" not found in '{file_path}', value not added"
             )
+            continue
+        p = filename_params[parameter]
+        if values_as_float:
+            p = float(p)
+        param_dict[parameter] = p
 
     return param_dict
 
 
 ################################################################################
-def read_hdf5(filename):
+def read_hdf5(filename, datasets=None):
     """
     Read a HDF5-format file (e.g. GYRE)
 
@@ -103,6 +113,8 @@ def read_hdf5(filename):
     ----------
     filename : string
         Input file
+    datasets: list of strings
+        Names of the datasets to read, the default 'None' reads all datasets in the file.
 
     Returns
     ----------
@@ -114,11 +126,11 @@ def read_hdf5(filename):
     # Open the file
     with h5py.File(filename, "r") as file:
         # Read attributes
-        attributes = dict(zip(file.attrs.keys(), file.attrs.values()))
-        # Read datasets
-        data = {}
-        for k in file.keys():
-            data[k] = file[k][...]
+        attributes = dict(file.attrs.items())
+        # Read datasets, each in one read call
+        if datasets is None:
+            datasets = file.keys()
+        data = {k: file[k][()] for k in datasets}
     return attributes, data
 
 
@@ -136,10 +148,47 @@ def sign(x):
     s: string
         A string representing the sign of the number
     """
-    if abs(x) == x:
-        return "+"
-    else:
-        return "-"
+    return "+" if x >= 0 else "-"
+
+
+################################################################################
+def sign_array(a):
+    """
+    Returns the signs of an array of numbers as strings
+
+    Parameters
+    ----------
+    a: numpy array or list of float or int
+
+    Returns
+    ----------
+    s: numpy array, dtype=str
+        Strings representing the sign of each of the numbers
+    """
+    return np.where(np.asarray(a) >= 0, "+", "-")
+
+
+################################################################################
+def pool_chunksize(nr_tasks, nr_cpu=None):
+    """
+    Number of tasks to send at once to each processor of a multiprocessing pool,
+    so that each processor receives about 4 chunks (the same heuristic as used by Pool.map).
+
+    Parameters
+    ----------
+    nr_tasks: int
+        Number of tasks that will be sent to the pool.
+    nr_cpu: int
+        Number of worker processes in the pool. The default 'None' will use the number returned by os.cpu_count().
+
+    Returns
+    ----------
+    chunksize: int
+        Number of tasks per chunk, at least 1.
+    """
+    if nr_cpu is None:
+        nr_cpu = os.cpu_count()
+    return max(1, -(-nr_tasks // (4 * nr_cpu)))
 
 
 ################################################################################
@@ -162,10 +211,11 @@ def get_subgrid_dataframe(file_to_read, fixed_params=None):
     df = pd.read_hdf(file_to_read)
 
     if fixed_params is not None:
-        for param in fixed_params.keys():
-            indices_to_drop = df[df[param] != fixed_params[param]].index
-            df.drop(indices_to_drop, inplace=True)
-        df.reset_index(drop=True, inplace=True)
+        # Combine the conditions on all fixed parameters, and select the models in one go
+        mask = np.ones(len(df), dtype=bool)
+        for param, value in fixed_params.items():
+            mask &= df[param].to_numpy() == value
+        df = df.loc[mask].reset_index(drop=True)
 
     return df
 
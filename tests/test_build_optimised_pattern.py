@@ -21,6 +21,25 @@ def test_generate_spacing_series_with_errors():
     assert all ([abs((a-b)/a)< 1E-10 for a,b in zip(expected_spacing, result[0])])
     assert all ([abs((a-b)/a)< 1E-10 for a,b in zip(expected_errors, result[1])])
 
+def test_generate_spacing_series_grid():
+    """Test period spacing series of multiple models calculated by generate_spacing_series_grid"""
+    periods = [[0.2, 0.3, 0.38, 0.42, 0.45], [1.1, 1.3, 1.39, 1.47, 1.52]]
+    result = bop.generate_spacing_series_grid(periods)
+
+    assert result.shape == (2, 4)
+    for row, model_periods in zip(result, periods):
+        assert np.allclose(row, bop.generate_spacing_series(model_periods)[0], rtol=1E-15, atol=0)
+
+    out = np.empty((2, 4))
+    assert bop.generate_spacing_series_grid(periods, out=out) is out
+    assert np.array_equal(out, result)
+
+    # Spacings kept in units of days, written in a column slice of a larger array
+    out = np.zeros((2, 6))
+    bop.generate_spacing_series_grid(periods, out=out[:, 1:5], to_seconds=False)
+    assert np.allclose(out[:, 1:5], np.abs(np.diff(periods)), rtol=1E-15, atol=0)
+    assert not out[:, [0, 5]].any()
+
 def test_puls_series_from_given_puls_at_end():
     """Test building theoretical pulsation pattern from end of pattern."""
     theory_freq = np.asarray([0.6, 0.7, 0.8, 0.9, 1.0, 1.1, 1.2, 1.3])
@@ -40,6 +59,16 @@ def test_puls_series_from_given_puls_midway():
     result = bop.puls_series_from_given_puls(theory_freq, obs_freq, obs_to_build_from)
     assert all ([abs((a-b)/a)< 1E-10 for a,b in zip(expected, result)])
 
+def test_puls_series_from_given_puls_missing_theory():
+    """Test building theoretical pulsation pattern where the observations miss a theoretical counterpart."""
+    theory_freq = np.asarray([0.6, 0.7, 0.8, 0.9])
+    obs_freq = np.asarray([0.5, 0.58, 0.68, 0.76, 0.88, 0.95])
+    obs_to_build_from = 0.68
+    expected = [-1, 0.6, 0.7, 0.8, 0.9, -1]
+    result = bop.puls_series_from_given_puls(theory_freq, obs_freq, obs_to_build_from)
+    assert len(result) == len(expected)
+    assert all ([abs((a-b)/a)< 1E-10 for a,b in zip(expected, result)])
+
 def test_chisq_longest_sequence():
     """Test building theoretical pulsation pattern according to the longest sequence method."""
     theory_freq = np.asarray([0.6, 0.7, 0.8, 0.9, 1.0, 1.1, 1.2, 1.3])
@@ -65,3 +94,47 @@ def test_chisq_longest_sequence2():
     assert abs(result[0]-0.09826369168357019) < 1E-17
     assert all ([abs((a-b)/a)< 1E-10 for a,b in zip(expected_freq, result[1])])
     assert all ([abs((a-b)/a)< 1E-10 for a,b in zip(expected_orders, result[2])])    
+
+def test_rescale_rotation_and_select_theoretical_pattern_split_pattern():
+    """Test that periods chosen in a split-off part of the pattern are not selected again in the next part."""
+    theory_periods = np.asarray([1.0, 1.1, 1.2, 1.3, 1.4, 1.5, 1.6, 1.7])
+    orders    = np.asarray([-1, -2, -3, -4, -5, -6, -7, -8])
+    obs_parts = [np.asarray([1.02, 1.11, 1.19]), np.asarray([1.22, 1.31])]
+    obs_err_parts = [np.asarray([0.01, 0.01, 0.01]), np.asarray([0.01, 0.01])]
+    obs = np.asarray([1.02, 1.11, 1.19, 0, 1.22, 1.31])
+    expected = [1.0, 1.1, 1.2, 0, 1.3, 1.4]
+    result = bop.rescale_rotation_and_select_theoretical_pattern(None, None, 0.5, 1/theory_periods, orders, obs,
+                                                                 obs_parts, obs_err_parts, 'period',
+                                                                 'highest-frequency', [None, None])
+    assert all ([abs(a-b)< 1E-10 for a,b in zip(expected, result + obs)])
+
+    # The first part uses up the last theoretical periods, none are left for the second part
+    theory_periods = np.asarray([1.0, 1.1, 1.2, 1.3])
+    orders    = np.asarray([-1, -2, -3, -4])
+    obs_parts = [np.asarray([1.11, 1.19, 1.31]), np.asarray([1.5, 1.6])]
+    obs_err_parts = [np.asarray([0.01, 0.01, 0.01]), np.asarray([0.01, 0.01])]
+    obs = np.asarray([1.11, 1.19, 1.31, 0, 1.5, 1.6])
+    expected = [1.1, 1.2, 1.3, 0, -1, -1]
+    for method, starting_pulsations in [('highest-frequency', [None, None]), ('provided-pulsation', [1.11, 1.5]),
+                                        ('chisq-longest-sequence', [None, None])]:
+        result = bop.rescale_rotation_and_select_theoretical_pattern(None, None, 0.5, 1/theory_periods, orders, obs,
+                                                                     obs_parts, obs_err_parts, 'period',
+                                                                     method, starting_pulsations)
+        assert all ([abs(a-b)< 1E-10 for a,b in zip(expected, result + obs)])
+
+    # A single theoretical period is left for a part with a single observation
+    obs_parts = [np.asarray([1.02, 1.11, 1.19]), np.asarray([1.31])]
+    obs_err_parts = [np.asarray([0.01, 0.01, 0.01]), np.asarray([0.01])]
+    obs = np.asarray([1.02, 1.11, 1.19, 0, 1.31])
+    expected = [1.0, 1.1, 1.2, 0, 1.3]
+    result = bop.rescale_rotation_and_select_theoretical_pattern(None, None, 0.5, 1/theory_periods, orders, obs,
+                                                                 obs_parts, obs_err_parts, 'period',
+                                                                 'chisq-longest-sequence', [None, None])
+    assert all ([abs(a-b)< 1E-10 for a,b in zip(expected, result + obs)])
+
+    # A model with a single computed mode, for an unsplit pattern
+    obs = np.asarray([1.09, 1.21])
+    result = bop.rescale_rotation_and_select_theoretical_pattern(None, None, 0.5, 1/np.asarray([1.1]), np.asarray([-2]),
+                                                                 obs, [obs], [np.asarray([0.01, 0.01])], 'period',
+                                                                 'highest-frequency', [None])
+    assert all ([abs(a-b)< 1E-10 for a,b in zip([1.1, -1], result + obs)])
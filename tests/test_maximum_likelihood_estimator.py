@@ -1,5 +1,6 @@
 from foam import maximum_likelihood_estimator as mle
 import numpy as np
+import pandas as pd
 import unittest
 
 def test_merit_chi2():
@@ -26,6 +27,42 @@ def test_merit_mahalanobis():
     assert all ([abs((a-b)/a)< 1E-8 for a,b in zip(expected, result)])        
 
 
+def test_likelihood_coefficients():
+    """ test the coefficients of the likelihood functions of the reduced chi2 and the mahalanobis distance"""
+    merit_values = np.asarray([0, 3.2, 15.9])
+
+    scale, constant = mle.likelihood_coefficients("CS", nr_observables=10, k=2)
+    result = np.exp(scale * merit_values + constant)
+    expected = np.exp(-0.5 * merit_values / 8)
+    assert all ([abs((a-b)/a)< 1E-12 for a,b in zip(expected, result)])
+
+    scale, constant = mle.likelihood_coefficients("MD", nr_observables=None, k=2, ln_det_v=-40.5)
+    result = np.exp(scale * merit_values + constant)
+    expected = np.exp(-0.5 * (merit_values + 2 * np.log(2 * np.pi) - 40.5))
+    assert all ([abs((a-b)/a)< 1E-12 for a,b in zip(expected, result)])
+
+
+class test_likelihood_coefficients_exit(unittest.TestCase):
+    def test_invalid_merit_function(self):
+        with self.assertRaises(SystemExit):
+            mle.likelihood_coefficients("XX", nr_observables=10, k=2)
+
+
+def test_create_theory_observables_grid_empty_parts():
+    """ test period spacings of the grid when parts of the pattern between interruptions hold less than 2 periods"""
+    periods = np.asarray([[1.0, 1.1, 1.3, 1.6, 2.0, 2.5], [1.0, 1.2, 1.5, 1.9, 2.4, 3.0]])
+    theory_dataframe = pd.DataFrame(periods, columns=[f"period{i}" for i in range(1, 7)])
+    theory_dataframe["logg"] = [4.0, 4.1]
+
+    # Interruption at the start, and two consecutive interruptions
+    for missing_indices, expected_columns in [([0], [0, 1, 2, 3, 4]), ([3, 3], [0, 1, 3, 4])]:
+        result = mle.create_theory_observables_grid(theory_dataframe, ["dP", "logg"], missing_indices)
+        expected = np.column_stack((np.diff(periods)[:, expected_columns], theory_dataframe["logg"]))
+
+        assert result.shape == expected.shape
+        assert np.allclose(result, expected, rtol=1E-12, atol=0)
+
+
 class test_matrix(unittest.TestCase):
     def test_check_matrix_exit(self):
         matrix = np.asarray([[1, 2, 3], [1, 2, 3], [1, 2, 3]])
@@ -36,3 +73,92 @@ class test_matrix(unittest.TestCase):
     def test_check_matrix(self):
         matrix = np.asarray([[2, 1, 1], [1, 2, 1], [1, 1, 2]])
         mle.check_matrix(matrix, generate_output=False)
+
+
+def _error_ellipse_brute_force(df, merit_function, nr_observables, free_parameters, ln_det_v=None, percentile=0.95):
+    """ models within the error ellipse by summing the probabilities of the models sorted by merit value"""
+    df = df.sort_values("meritValue", ascending=True)
+    k = len(free_parameters)
+    if merit_function == "CS":
+        prob = np.exp(-0.5 * (df["meritValue"] - df["meritValue"].iloc[0]) / (nr_observables - k))
+    else:
+        prob = np.exp(-0.5 * (df["meritValue"] - df["meritValue"].iloc[0] + k * np.log(2 * np.pi) + ln_det_v))
+    for column_name in free_parameters:
+        prob = prob * df[column_name].map(df[column_name].value_counts(normalize=True))
+    cumulative_probability = np.cumsum(prob.to_numpy()) / prob.sum()
+    i = np.flatnonzero(cumulative_probability >= percentile)[0]
+    return df.iloc[: i + 1]
+
+
+def _write_merit_values(file_name, nr_models=300, seed=1):
+    """ write a small grid of merit values in 'table' format, with distinct merit values"""
+    rng = np.random.default_rng(seed)
+    df = pd.DataFrame({"meritValue": rng.permutation(np.linspace(5, 200, nr_models)),
+                       "M": rng.choice([3.0, 3.5, 4.0], nr_models),
+                       "Z": rng.choice([0.010, 0.014], nr_models),
+                       "Xc": rng.choice([0.2, 0.3, 0.4, 0.5, 0.6], nr_models),
+                       "extra": rng.random(nr_models)})
+    df.to_hdf(file_name, key="merit_values", format="table", mode="w")
+    return df
+
+
+def test_models_in_error_ellipse(tmp_path):
+    """ test the selection of models within the error ellipse against summing the sorted probabilities"""
+    merit_file = tmp_path / "star_CS_P.hdf"
+    df = _write_merit_values(merit_file)
+    free_parameters = ["M", "Z", "Xc"]
+
+    for merit_function, nr_observables, ln_det_v in [("CS", 8, None), ("MD", 8, -40.5)]:
+        output_file = tmp_path / f"ellipse_{merit_function}.hdf"
+        mle.models_in_error_ellipse(merit_file, output_file, merit_function, nr_observables,
+                                    ln_det_v=ln_det_v, free_parameters=free_parameters)
+        result = pd.read_hdf(output_file)
+        expected = _error_ellipse_brute_force(df, merit_function, nr_observables, free_parameters, ln_det_v)
+
+        assert len(result) > 1
+        assert list(result.index) == list(expected.index)
+        assert result.equals(expected)
+        # The best model is the first row
+        assert result["meritValue"].iloc[0] == df["meritValue"].min()
+
+
+def test_models_in_error_ellipse_likelihood_cutoff_fallback(tmp_path):
+    """ test that all models are included when the models left out by the likelihood cutoff could matter"""
+    merit_file = tmp_path / "star_CS_P.hdf"
+    df = _write_merit_values(merit_file)
+    free_parameters = ["M", "Z", "Xc"]
+    nr_observables = 40
+
+    # With a cutoff close to 1, the left out models hold most of the probability, so all models need to be included
+    output_file = tmp_path / "ellipse_cutoff.hdf"
+    mle.models_in_error_ellipse(merit_file, output_file, "CS", nr_observables,
+                                free_parameters=free_parameters, likelihood_cutoff=0.9)
+    result = pd.read_hdf(output_file)
+    expected = _error_ellipse_brute_force(df, "CS", nr_observables, free_parameters)
+
+    assert len(result) > 1
+    assert result.equals(expected)
+    assert result["meritValue"].iloc[0] == df["meritValue"].min()
+
+
+def test_calculate_likelihood_discards_missing_pulsations(tmp_path, monkeypatch):
+    """ test that models with a value -1 anywhere in their pattern are discarded, also in between other periods"""
+    monkeypatch.chdir(tmp_path)
+    (tmp_path / "meritvalues").mkdir()
+
+    obs_file = tmp_path / "star_obs.tsv"
+    obs_file.write_text("index period period_err\nf1 1.0 0.01\nf2 1.1 0.01\nf3 1.2 0.01\n")
+    theory_dataframe = pd.DataFrame({"rot": [0.5, 0.5, 0.5, 0.5], "rot_err": [0.1, 0.1, 0.1, 0.1],
+                                     "M": [3.0, 3.5, 4.0, 4.5],
+                                     "period1": [1.0, -1, 1.0, 1.01],
+                                     "period2": [1.1, 1.1, -1, 1.1],
+                                     "period3": [1.2, 1.2, 1.2, 1.21]})
+    theory_file = tmp_path / "grid_star_periods.hdf"
+    theory_dataframe.to_hdf(theory_file, key="puls_grid", format="table", mode="w")
+
+    mle.calculate_likelihood(theory_file, observables=["P"], merit_function="CS", obs_path=obs_file,
+                             star_name="star", grid_parameters=["M"])
+    result = pd.read_hdf(tmp_path / "meritvalues" / "star_periods_CS_P.hdf")
+
+    assert list(result["M"]) == [3.0, 4.5]
+    assert np.allclose(result["meritValue"], [0, 2], rtol=1E-12, atol=1E-12)
@@ -12,6 +12,12 @@ def test_sign_neg():
     expected = '-'
     assert result == expected
 
+def test_sign_array():
+    """ test signs of an array"""
+    result = sf.sign_array([3, -2, 0, -0.5])
+    expected = ['+', '-', '+', '-']
+    assert list(result) == expected
+
 def test_get_param_from_filename():
     """ Test if the requested parameters get retrieved correctly from a filename."""
     file_path = 'Test-string_A7_B0_moreParams153_Comma3.56.hdf'
@@ -20,6 +26,14 @@ def test_get_param_from_filename():
     expected = {'A':'7', 'B':'0', 'Comma':'3.56'}
     assert result == expected
 
+def test_get_param_from_filename_as_float():
+    """ Test if the parameters of a GYRE summary file get retrieved as floats."""
+    file_path = 'GYRE_out/rot0.6304_k0m1/rot0.6304_Z0.008_M3.00_logD-1.00_aov0.000_Xc0.10.HDF'
+    parameters = ['rot', 'Z', 'M', 'logD', 'aov', 'Xc']
+    result = sf.get_param_from_filename(file_path, parameters, values_as_float=True)
+    expected = {'rot':0.6304, 'Z':0.008, 'M':3.0, 'logD':-1.0, 'aov':0.0, 'Xc':0.1}
+    assert result == expected
+
 def test_split_line():
     line = 'string_to_be_split'
     result1, result2 = sf.split_line(line, 'to')
@@ -33,3 +47,10 @@ def test_substring():
     result = sf.substring(line, 'st', '_')
     expected = 'ring'
     assert result == expected
+
+def test_pool_chunksize():
+    """ Test the number of tasks sent at once to each processor of a pool."""
+    assert sf.pool_chunksize(100, 4) == 7
+    assert sf.pool_chunksize(96, 4) == 6
+    assert sf.pool_chunksize(3, 4) == 1
+    assert sf.pool_chunksize(0, 4) == 1